@@ -3,12 +3,19 @@ import cv2
 import mss
 import time
 import json
+import queue
+import msgpack
+import xxhash
 import numpy as np
 import platform
-from threading import Thread, Lock, Event
+import functools
+import contextlib
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock, Event, BoundedSemaphore
 from pynput import keyboard, mouse
 
-from rich.console import Console
+from rich.console import Console, Group
 from rich.table import Table
 from datetime import timedelta, datetime
 from tqdm import tqdm
@@ -38,7 +45,8 @@ enable_mac_raw_data = USE_MAC_RAW_INPUT
 # -----------------------------------------------------------
 # MAC-SPECIFIC RAW INPUT (Quartz)
 # -----------------------------------------------------------
-raw_mouse_deltas = []  # We'll store raw events {timestamp, dx, dy} here
+raw_mouse_deltas = deque()  # We'll store raw events {dx, dy} here
+raw_event_ready = Event()    # Set by the Quartz callback whenever a delta is queued
 
 def mouse_event_callback(proxy, event_type, event, refcon):
     """
@@ -47,14 +55,15 @@ def mouse_event_callback(proxy, event_type, event, refcon):
     import Quartz
     dx = Quartz.CGEventGetIntegerValueField(event, Quartz.kCGMouseEventDeltaX)
     dy = Quartz.CGEventGetIntegerValueField(event, Quartz.kCGMouseEventDeltaY)
-    timestamp = time.time()
-    
-    # Append to a global list
+
+    # Append to a global queue (deque appends are thread-safe) and wake the poller.
+    # No timestamp: events are stamped when queued in 'add_event', which keeps
+    # 'pending_events' in timestamp order
     raw_mouse_deltas.append({
-        "timestamp": timestamp,
         "dx": dx,
         "dy": dy
     })
+    raw_event_ready.set()
     return event
 
 def start_mac_raw_input_tap():
@@ -104,11 +113,26 @@ def start_mac_raw_input_tap():
 # NOTE: You can adjust these if you want a different capture size, format, etc.
 FRAME_WIDTH, FRAME_HEIGHT = 224, 224
 FPS = 30
+USE_DXCAM = True  # Windows only: capture through DXGI (dxcam) when installed, instead of mss
+# Linux only: keep the capture thread on one CPU to reduce jitter. Off by default, since
+# threads inherit the affinity of the thread that starts them.
+PIN_CAPTURE_THREAD = False
 MOUSE_MOVE_TIMEOUT = 0.2
+MOUSE_MOVE_TIMEOUT_NS = int(MOUSE_MOVE_TIMEOUT * 1e9)
 
-SAVE_FORMAT = ".webp"
+# ".mp4" appends every frame to one video per trial, ".webp" writes one image per frame.
+# mp4v encodes far faster than the capture rate; VP9 via cv2.VideoWriter can't keep up with 30 FPS.
+SAVE_FORMAT = ".mp4"
+VIDEO_FOURCCS = {".mp4": "mp4v"}
+TRIAL_VIDEO_BASENAME = "frames"
 SAVE_QUALITY_PARAM = cv2.IMWRITE_WEBP_QUALITY
 SAVE_QUALITY_VALUE = 80
+FRAME_WRITE_QUEUE_SIZE = 64  # Max frames waiting to be encoded before capture blocks
+FRAME_ENCODE_WORKERS = os.cpu_count()  # Parallel encoders for .webp frames
+
+# Visualization frame prefetching (frames decoded around the current one, and kept in an LRU cache)
+PREFETCH_BEHIND, PREFETCH_AHEAD = 2, 8
+FRAME_CACHE_SIZE = 64
 
 # Key codes for arrow navigation in the OpenCV window
 LEFT_KEYS = [2424832, 65361, 63234]   # Left
@@ -123,7 +147,8 @@ running = True
 recording = False
 dataset_name = None
 next_trial_number = 0
-trial_data_log = []
+trial_log_file = None  # Open TrialData_<N>.msgpack of the current trial
+trial_log_packer = msgpack.Packer()
 trial_frame_counter = 0
 trial_folder_path = None
 
@@ -131,21 +156,37 @@ pressed_keys = set()
 pressed_mouse_buttons = set()
 
 # Cursor tracking (pynput)
-last_mouse_move_time = 0.0
+last_mouse_move_time = 0  # time.monotonic_ns()
 last_mouse_x = 0.0
 last_mouse_y = 0.0
 
+# Pynput mouse moves are coalesced into a single event per frame: the first move queues
+# this event (fixing its time and numbering), later ones only update its position/delta
+pending_move_event = None
+
 # For the mac raw input poll
 mac_raw_poll_thread = None
 
+# Background frame encoding/writing
+frame_write_q = queue.Queue(maxsize=FRAME_WRITE_QUEUE_SIZE)  # Video frames, in order
+frame_writer_thread = None
+trial_video_writer = None  # None when frames are written as separate images
+frame_writer_failed = Event()  # Set if the video writer raised, later frames are dropped
+frame_encode_pool = None   # Encodes .webp frames in parallel (they're independent)
+frame_encode_slots = BoundedSemaphore(FRAME_WRITE_QUEUE_SIZE)
+
+# CPUs the process may use, saved before the capture thread pins itself
+process_cpu_affinity = None
+
 # Synchronization
 state_lock = Lock()
 stop_capture_event = Event()
+capture_done_event = Event()  # Set once the capture thread has logged and queued its last frame
 
 # -----------------------------------------------------------
 # EVENTS STORAGE
 # -----------------------------------------------------------
-pending_events = []
+pending_events = deque()  # Appended in timestamp order
 global_event_count = 0
 
 # -----------------------------------------------------------
@@ -155,39 +196,169 @@ def ensure_folder_exists(folder_path: str):
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
 
+def frame_key(frame_index: int) -> str:
+    return f"frame_{frame_index}"
+
+def find_trial_video(trial_folder: str):
+    """
+    Returns the path of the trial's video file, or None if the trial was saved as images.
+    """
+    for ext in VIDEO_FOURCCS:
+        video_path = os.path.join(trial_folder, TRIAL_VIDEO_BASENAME + ext)
+        if os.path.exists(video_path):
+            return video_path
+    return None
+
+def open_trial_video_writer(trial_folder: str):
+    """
+    Opens the trial's video file for writing when SAVE_FORMAT is a video container.
+    Returns None (frames are saved as .webp images) otherwise, or if the codec is unavailable.
+    """
+    if SAVE_FORMAT not in VIDEO_FOURCCS:
+        return None
+
+    video_path = os.path.join(trial_folder, TRIAL_VIDEO_BASENAME + SAVE_FORMAT)
+    fourcc = cv2.VideoWriter_fourcc(*VIDEO_FOURCCS[SAVE_FORMAT])
+    writer = cv2.VideoWriter(video_path, fourcc, FPS, (FRAME_WIDTH, FRAME_HEIGHT))
+    if not writer.isOpened():
+        print(f"[WARN] Could not open video writer for {video_path}. Saving frames as .webp images.")
+        return None
+    return writer
+
+def read_trial_frame(trial_folder: str, video_cap, stream_index: int):
+    """
+    Reads a single stored frame of a trial, from its video if 'video_cap' is given, otherwise
+    from the frame's image file. Returns None if the frame cannot be read.
+    """
+    if video_cap is not None:
+        # Sequential reads are cheap, only seek when jumping around
+        if int(video_cap.get(cv2.CAP_PROP_POS_FRAMES)) != stream_index:
+            video_cap.set(cv2.CAP_PROP_POS_FRAMES, stream_index)
+        ok, img = video_cap.read()
+        return img if ok else None
+    return cv2.imread(os.path.join(trial_folder, frame_key(stream_index) + ".webp"))
+
 def scan_existing_trials(dataset_path: str) -> int:
     max_trial = -1
-    for entry in os.listdir(dataset_path):
-        if entry.startswith("Trial_"):
-            try:
-                trial_num = int(entry.replace("Trial_", ""))
-                if trial_num > max_trial:
-                    max_trial = trial_num
-            except ValueError:
-                pass
+    with os.scandir(dataset_path) as entries:
+        for entry in entries:
+            name = entry.name
+            if not name.startswith("Trial_"):
+                continue
+            suffix = name[6:]  # len("Trial_")
+            # Skips e.g. 'Trial_3_combined.npz' without raising
+            if not suffix.isdecimal() or not entry.is_dir():
+                continue
+            trial_num = int(suffix)
+            if trial_num > max_trial:
+                max_trial = trial_num
     return max_trial
 
+def trial_log_path(trial_number: int) -> str:
+    return os.path.join(dataset_name, f"TrialData_{trial_number}.msgpack")
+
+def open_trial_data_log(trial_number: int):
+    global trial_log_file
+    trial_log_file = open(trial_log_path(trial_number), "wb", buffering=1 << 20)
+
+def append_trial_data_log(entry: dict):
+    """
+    Streams one log entry to disk as a MessagePack record, so the log never piles up in memory.
+    Records are self-delimiting, so they are simply concatenated.
+    """
+    trial_log_file.write(trial_log_packer.pack(entry))
+
 def save_trial_data_log(trial_number: int):
-    global trial_data_log, dataset_name
-    if dataset_name is None:
+    global trial_log_file
+    if trial_log_file is None:
         return
 
-    json_filename = os.path.join(dataset_name, f"TrialData_{trial_number}.json")
-    with open(json_filename, "w") as f:
-        json.dump(trial_data_log, f, indent=4)
-    print(f"[INFO] Trial #{trial_number} data saved to {json_filename}")
+    trial_log_file.close()
+    trial_log_file = None
+    print(f"[INFO] Trial #{trial_number} data saved to {trial_log_path(trial_number)}")
 
-def add_event(keyboard_keys=None, mouse_buttons=None, 
-              mouse_move=False, x=None, y=None, dx=None, dy=None,
-              raw_input=False):
+def find_trial_log(trial_number: int):
+    """
+    Returns the trial's MessagePack log, or its TrialData_<N>.json if the trial predates it.
+    Returns None if neither exists.
+    """
+    for log_path in (trial_log_path(trial_number),
+                     os.path.join(dataset_name, f"TrialData_{trial_number}.json")):
+        if os.path.exists(log_path):
+            return log_path
+    return None
+
+def upgrade_legacy_entry(entry: dict) -> dict:
+    """
+    Maps an entry of a legacy JSON log onto the current schema: 'frame_N.webp' filenames
+    become frame/stream index N, float second timestamps also get a 'timestamp_ns'.
+    """
+    if "filename" in entry and "frame_index" not in entry:
+        name = os.path.splitext(entry["filename"])[0]
+        entry["frame_index"] = entry["stream_index"] = int(name[len("frame_"):])
+    for item in [entry, *entry.get("events", [])]:
+        if "timestamp" in item and "timestamp_ns" not in item:
+            item["timestamp_ns"] = int(item["timestamp"] * 1e9)
+    return entry
+
+def event_wall_time(evt: dict, frame: dict) -> float:
     """
-    Adds a new event to 'pending_events'.
+    Wall-clock time of an event, placed relative to its frame's wall-clock 'timestamp'.
+    """
+    return frame["timestamp"] + (evt["timestamp_ns"] - frame["timestamp_ns"]) / 1e9
+
+def to_legacy_entry(entry: dict) -> dict:
+    """
+    Shapes a log entry like the original JSON log: frames get a 'frame_N.webp' filename
+    (N = stream index) and their events a wall-clock 'timestamp'.
+    """
+    if "frame_index" not in entry:
+        return entry
+    legacy = dict(entry)
+    legacy["filename"] = frame_key(entry.get("stream_index", entry["frame_index"])) + ".webp"
+    legacy["events"] = [
+        {**evt, "timestamp": event_wall_time(evt, entry)} if "timestamp_ns" in evt else evt
+        for evt in entry.get("events", [])
+    ]
+    return legacy
+
+def load_trial_data_log(log_path: str) -> list:
+    if log_path.endswith(".json"):
+        with open(log_path, "r") as f:
+            return [upgrade_legacy_entry(entry) for entry in json.load(f)]
+    with open(log_path, "rb") as f:
+        return list(msgpack.Unpacker(f, raw=False))
+
+def ask_trial_number(action: str):
+    """
+    Prompts for a trial number, defaulting to the last trial. Returns None if there is none.
+    """
+    trial_input = input(f"Enter trial number to {action} (leave blank for last trial): ").strip()
+    if trial_input == "":
+        chosen_trial = scan_existing_trials(dataset_name)
+        if chosen_trial < 0:
+            print(f"[WARN] No trials found in this dataset. Nothing to {action}.")
+            return None
+        return chosen_trial
+
+    try:
+        return int(trial_input)
+    except ValueError:
+        print(f"[WARN] Invalid trial number input. Aborting {action}.")
+        return None
+
+def make_event(keyboard_keys=None, mouse_buttons=None,
+               mouse_move=False, x=None, y=None, dx=None, dy=None,
+               raw_input=False):
+    """
+    Builds a new event and assigns it the next global number.
     'raw_input' indicates if it's from mac raw deltas (Quartz), or normal OS data.
+    Event times are time.monotonic_ns(), so ordering is immune to wall-clock adjustments.
     """
     global global_event_count
     evt = {
         "global_number": global_event_count,
-        "timestamp": time.time(),
+        "timestamp_ns": time.monotonic_ns(),
         "keyboard_keys": keyboard_keys or [],
         "mouse_buttons": mouse_buttons or [],
         "mouse_is_moving": mouse_move,
@@ -200,27 +371,46 @@ def add_event(keyboard_keys=None, mouse_buttons=None,
             evt["mouse_delta"] = [dx, dy]
 
     global_event_count += 1
-    pending_events.append(evt)
+    return evt
+
+def add_event(**kwargs):
+    """
+    Adds a new event (see 'make_event') to 'pending_events'.
+    """
+    pending_events.append(make_event(**kwargs))
 
 # -----------------------------------------------------------
 # MAC RAW INPUT POLLING
 # -----------------------------------------------------------
 def poll_mac_raw_deltas():
     """
-    Continuously poll the 'raw_mouse_deltas' queue and convert them into events.
+    Converts queued 'raw_mouse_deltas' into events as soon as the Quartz callback signals them.
     This thread runs only while 'recording' is True.
     """
+    # Bind hot-loop globals to locals once
+    wait_ready, clear_ready = raw_event_ready.wait, raw_event_ready.clear
+    pop_delta = raw_mouse_deltas.popleft
+    lock, _add_event = state_lock, add_event
+
     while recording:
-        time.sleep(0.01)
-        with state_lock:
-            while raw_mouse_deltas:
-                delta = raw_mouse_deltas.pop(0)
-                dx = delta["dx"]
-                dy = delta["dy"]
-                add_event(
-                    mouse_move=True, 
-                    dx=dx, 
-                    dy=dy,
+        # Timeout only so the 'recording' flag gets rechecked
+        wait_ready(0.05)
+        clear_ready()
+        batch = []
+        while True:
+            try:
+                batch.append(pop_delta())
+            except IndexError:
+                break
+        if not batch:
+            continue
+        # One lock round-trip for the whole batch
+        with lock:
+            for delta in batch:
+                _add_event(
+                    mouse_move=True,
+                    dx=delta["dx"],
+                    dy=delta["dy"],
                     raw_input=True
                 )
 
@@ -230,13 +420,18 @@ def poll_mac_raw_deltas():
 last_os_mouse_x = 0.0
 last_os_mouse_y = 0.0
 
+@functools.lru_cache(maxsize=512)
+def key_to_name(key) -> str:
+    """
+    Character for printable keys, 'Key.<name>' for special keys. Cached per key object.
+    """
+    char = getattr(key, "char", None)
+    return char if char else str(key)
+
 def on_key_press(key):
     if not recording:
         return
-    try:
-        key_name = key.char if key.char else str(key)
-    except:
-        key_name = str(key)
+    key_name = key_to_name(key)
     with state_lock:
         if key_name not in pressed_keys:
             pressed_keys.add(key_name)
@@ -245,10 +440,7 @@ def on_key_press(key):
 def on_key_release(key):
     if not recording:
         return
-    try:
-        key_name = key.char if key.char else str(key)
-    except:
-        key_name = str(key)
+    key_name = key_to_name(key)
     with state_lock:
         if key_name in pressed_keys:
             pressed_keys.remove(key_name)
@@ -260,21 +452,19 @@ def on_mouse_click(x, y, button, pressed):
     btn_str = str(button)
     with state_lock:
         if pressed:
-            if btn_str not in pressed_mouse_buttons:
-                pressed_mouse_buttons.add(btn_str)
-            add_event(mouse_buttons=[btn_str], mouse_move=False)
+            pressed_mouse_buttons.add(btn_str)
         else:
-            if btn_str in pressed_mouse_buttons:
-                pressed_mouse_buttons.remove(btn_str)
-            add_event(mouse_buttons=[btn_str], mouse_move=False)
+            pressed_mouse_buttons.discard(btn_str)
+        add_event(mouse_buttons=[btn_str], mouse_move=False)
 
 def on_mouse_move(x, y):
     if not recording:
         return
     global last_mouse_move_time, last_mouse_x, last_mouse_y
     global last_os_mouse_x, last_os_mouse_y
+    global pending_move_event
 
-    now = time.time()
+    now = time.monotonic_ns()
     dx = x - last_os_mouse_x
     dy = y - last_os_mouse_y
 
@@ -282,84 +472,253 @@ def on_mouse_move(x, y):
         last_os_mouse_x, last_os_mouse_y = x, y
         last_mouse_x, last_mouse_y = float(x), float(y)
         last_mouse_move_time = now
-        add_event(
-            mouse_move=True,
-            x=last_mouse_x,
-            y=last_mouse_y,
-            dx=dx,
-            dy=dy,
-            raw_input=False
-        )
+        if pending_move_event is None:
+            pending_move_event = make_event(
+                mouse_move=True,
+                x=last_mouse_x,
+                y=last_mouse_y,
+                dx=dx,
+                dy=dy,
+                raw_input=False
+            )
+            pending_events.append(pending_move_event)
+        else:
+            # Fold into the move already queued for the next frame
+            pending_move_event["mouse_xy"] = [last_mouse_x, last_mouse_y]
+            pending_move_event["mouse_delta"][0] += dx
+            pending_move_event["mouse_delta"][1] += dy
+
+# -----------------------------------------------------------
+# BACKGROUND FRAME WRITER
+# -----------------------------------------------------------
+def frame_writer():
+    """
+    Appends frames queued by 'capture_screen' to the trial video, so encoding never blocks capture.
+    Video frames depend on each other, so a single thread writes them in order.
+    Runs until it receives the 'None' sentinel.
+    """
+    while True:
+        item = frame_write_q.get()
+        if item is None:
+            break
+        if frame_writer_failed.is_set():
+            continue  # Keep draining so producers never block on a full queue
+        _, img = item
+        try:
+            trial_video_writer.write(img)
+        except Exception as e:
+            print(f"[ERROR] Video writer failed, no further frames will be saved: {e}")
+            frame_writer_failed.set()
+
+def write_frame_image(stream_index: int, img):
+    frame_path = os.path.join(trial_folder_path, frame_key(stream_index) + ".webp")
+    cv2.imwrite(frame_path, img, [SAVE_QUALITY_PARAM, SAVE_QUALITY_VALUE])
+
+def submit_frame(stream_index: int, img):
+    """
+    Hands a captured frame over for encoding: to the ordered video writer, or to the
+    encoder pool for .webp images (cv2 releases the GIL while encoding).
+    Blocks once FRAME_WRITE_QUEUE_SIZE frames are in flight.
+    """
+    if trial_video_writer is not None:
+        if not frame_writer_failed.is_set():
+            frame_write_q.put((stream_index, img))
+        return
+
+    frame_encode_slots.acquire()
+    future = frame_encode_pool.submit(write_frame_image, stream_index, img)
+    future.add_done_callback(frame_encode_done)
+
+def frame_encode_done(future):
+    frame_encode_slots.release()
+    error = future.exception()
+    if error is not None:
+        print(f"[ERROR] Failed to write frame image: {error}")
 
 # -----------------------------------------------------------
 # CAPTURE FUNCTION (SCREEN + EVENTS)
 # -----------------------------------------------------------
+def open_dxcam_camera():
+    """
+    On Windows, creates a dxcam camera for the primary screen. DXGI desktop duplication
+    hands over frames without going through GDI, which is much faster than mss.
+    Returns None (use mss) on other OSes, or if dxcam is not installed.
+    """
+    if OS_NAME != "Windows" or not USE_DXCAM:
+        return None
+    try:
+        import dxcam
+    except ImportError:
+        print("[INFO] dxcam not installed, capturing with mss.")
+        return None
+    return dxcam.create(output_color="BGRA")
+
+def prepare_capture_pinning():
+    """
+    Runs on the main thread before a pinned capture thread starts. Threads started from the
+    capture thread would inherit its single-CPU affinity, so this saves the full mask (see
+    'restore_cpu_affinity') and starts OpenCV's worker pool here, with all CPUs.
+    """
+    global process_cpu_affinity
+    if not (PIN_CAPTURE_THREAD and hasattr(os, "sched_setaffinity")):
+        return
+
+    process_cpu_affinity = os.sched_getaffinity(0)
+    # A full-resolution INTER_AREA resize runs in parallel, which creates cv2's thread pool
+    warmup = np.zeros((1080, 1920, 4), dtype=np.uint8)
+    cv2.resize(warmup, (FRAME_WIDTH, FRAME_HEIGHT), interpolation=cv2.INTER_AREA)
+
+def restore_cpu_affinity():
+    if process_cpu_affinity is not None:
+        os.sched_setaffinity(0, process_cpu_affinity)
+
+def run_capture_thread():
+    try:
+        capture_screen()
+    finally:
+        capture_done_event.set()
+
 def capture_screen():
-    global trial_frame_counter, trial_data_log
+    global trial_frame_counter
     global pressed_keys, pressed_mouse_buttons
     global last_mouse_move_time, last_mouse_x, last_mouse_y
     global dataset_name, trial_folder_path, pending_events
+    global pending_move_event
     global recording
 
-    last_frame_time = time.time()
-    with mss.mss() as sct:
-        monitor = sct.monitors[1]  # Primary screen
-
-        while not stop_capture_event.is_set():
-            frame_start = time.time()
-            with state_lock:
-                mouse_is_moving = (frame_start - last_mouse_move_time) < MOUSE_MOVE_TIMEOUT
+    if PIN_CAPTURE_THREAD and hasattr(os, "sched_setaffinity"):
+        # On Linux, pid 0 means the calling thread only
+        os.sched_setaffinity(0, {max(os.sched_getaffinity(0))})
+
+    period = 1.0 / FPS
+    next_deadline = time.perf_counter() + period
+    last_frame_time = time.monotonic_ns()
+
+    # Identical consecutive frames are stored once: later ones only reference it
+    stream_counter = 0  # Number of frames actually stored
+    prev_hash = None
+    prev_frame_index = None
+
+    camera = open_dxcam_camera()
+    have_frame = False  # dxcam may report "no update" before delivering a first frame
+    # mss is only needed when dxcam isn't used
+    with (mss.mss() if camera is None else contextlib.nullcontext()) as sct:
+        monitor = sct.monitors[1] if sct is not None else None  # Primary screen
+
+        # Output buffers are allocated once and reused, so cv2 writes in-place
+        # instead of allocating fresh arrays every frame
+        small_bgra_out = np.empty((FRAME_HEIGHT, FRAME_WIDTH, 4), dtype=np.uint8)
+        bgr_small_out = np.empty((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+        frame_size = (FRAME_WIDTH, FRAME_HEIGHT)
+
+        # Bind hot-loop globals/attributes to locals once (LOAD_FAST instead of dict lookups)
+        _monotonic_ns, _wall_time = time.monotonic_ns, time.time
+        _perf_counter, _sleep = time.perf_counter, time.sleep
+        _stopped = stop_capture_event.is_set
+        _lock, _events = state_lock, pending_events
+        _popleft = pending_events.popleft
+        _timeout_ns = MOUSE_MOVE_TIMEOUT_NS
+        _grab = sct.grab if sct is not None else None
+        _frombuffer = np.frombuffer
+        _cam_grab = camera.grab if camera is not None else None
+        _resize, _copyto = cv2.resize, np.copyto
+        _log, _submit = append_trial_data_log, submit_frame
+        _hash = xxhash.xxh3_64_intdigest
+
+        while not _stopped():
+            frame_start = _monotonic_ns()
+            with _lock:
+                mouse_is_moving = (frame_start - last_mouse_move_time) < _timeout_ns
                 should_capture = bool(pressed_keys or pressed_mouse_buttons or mouse_is_moving)
 
             if should_capture:
-                screenshot = sct.grab(monitor)
-                img = np.array(screenshot)
-                # Convert BGRA to BGR
-                img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-                # Resize to desired dimension
-                img = cv2.resize(img, (FRAME_WIDTH, FRAME_HEIGHT), interpolation=cv2.INTER_AREA)
-
-                frame_time = time.time()
+                if _cam_grab is not None:
+                    # None when the screen hasn't changed: the previous frame is kept,
+                    # and the dedup below logs it as a duplicate
+                    buf = _cam_grab()
+                else:
+                    screenshot = _grab(monitor)
+                    # Wrap the raw BGRA bytes as an array view (no copy)
+                    buf = _frombuffer(screenshot.raw, dtype=np.uint8).reshape(
+                        screenshot.height, screenshot.width, 4
+                    )
+                if buf is not None:
+                    # Resize first (still BGRA) so only the small image gets color-converted
+                    small = _resize(buf, frame_size, dst=small_bgra_out,
+                                    interpolation=cv2.INTER_AREA)
+                    # BGRA to BGR: drop alpha through a strided view, copied into the contiguous buffer
+                    _copyto(bgr_small_out, small[..., :3])
+                    have_frame = True
+
+            # Nothing to log until the screen has actually been captured once
+            if should_capture and have_frame:
+                img = bgr_small_out
+
+                frame_time = _monotonic_ns()
                 frame_events = []
                 local_idx = 0
 
-                with state_lock:
-                    i = 0
-                    while i < len(pending_events):
-                        evt = pending_events[i]
-                        if last_frame_time < evt["timestamp"] <= frame_time:
-                            new_evt = dict(evt)
-                            new_evt["number"] = local_idx
+                # Only drain events and snapshot shared state under the lock,
+                # input callbacks block on it
+                with _lock:
+                    # Events are queued in timestamp order, so drain from the front
+                    while _events and _events[0]["timestamp_ns"] <= frame_time:
+                        evt = _popleft()
+                        if evt["timestamp_ns"] > last_frame_time:
+                            evt["number"] = local_idx
                             local_idx += 1
-                            frame_events.append(new_evt)
-                            pending_events.pop(i)
-                        else:
-                            i += 1
-
-                    frame_filename = f"frame_{trial_frame_counter}.webp"
-                    full_frame_path = os.path.join(trial_folder_path, frame_filename)
-                    cv2.imwrite(full_frame_path, img, [SAVE_QUALITY_PARAM, SAVE_QUALITY_VALUE])
-
-                    frame_entry = {
-                        "filename": frame_filename,
-                        "timestamp": frame_time,
-                        "events": frame_events,
-                        "held_keys": list(pressed_keys),
-                        "held_buttons": list(pressed_mouse_buttons),
-                        "mouse_is_moving": mouse_is_moving,
-                        "mouse_xy": [last_mouse_x, last_mouse_y]
-                    }
-
-                    trial_data_log.append(frame_entry)
-                    trial_frame_counter += 1
-
+                            frame_events.append(evt)
+
+                    # The coalesced move got drained with this frame, later moves start a new one
+                    if pending_move_event is not None and pending_move_event["timestamp_ns"] <= frame_time:
+                        pending_move_event = None
+
+                    held_keys = list(pressed_keys)
+                    held_buttons = list(pressed_mouse_buttons)
+                    mouse_xy = [last_mouse_x, last_mouse_y]
+
+                frame_index = trial_frame_counter
+                frame_hash = _hash(img)
+                is_duplicate = frame_hash == prev_hash
+                if not is_duplicate:
+                    prev_hash = frame_hash
+                    prev_frame_index = frame_index
+                    stream_counter += 1
+
+                frame_entry = {
+                    "frame_index": frame_index,
+                    "stream_index": stream_counter - 1,  # Stored frame holding this image
+                    "timestamp": _wall_time(),  # Wall clock, for display only
+                    "timestamp_ns": frame_time,
+                    "events": frame_events,
+                    "held_keys": held_keys,
+                    "held_buttons": held_buttons,
+                    "mouse_is_moving": mouse_is_moving,
+                    "mouse_xy": mouse_xy
+                }
+                if is_duplicate:
+                    frame_entry["duplicate_of"] = prev_frame_index
+
+                _log(frame_entry)
+                trial_frame_counter += 1
+
+                if not is_duplicate:
+                    # 'img' is a reused buffer, so the writer gets its own copy
+                    _submit(stream_counter - 1, img.copy())
                 last_frame_time = frame_time
 
-            elapsed = time.time() - frame_start
-            sleep_time = (1.0 / FPS) - elapsed
+            # Fixed-rate schedule: sleep until the next deadline so pacing doesn't drift
+            now = _perf_counter()
+            sleep_time = next_deadline - now
             if sleep_time > 0:
-                time.sleep(sleep_time)
+                _sleep(sleep_time)
+            else:
+                # Behind schedule, restart from now instead of bursting to catch up
+                next_deadline = now
+            next_deadline += period
 
+    if camera is not None:
+        camera.release()
     cv2.destroyAllWindows()
 
 # -----------------------------------------------------------
@@ -368,6 +727,38 @@ def capture_screen():
 vis_running = False
 stop_visualization_event = Event()
 
+# Table schemas, as (column name, add_column options)
+EVENT_COLUMNS = [
+    ("local_number", {"style": "dim"}),
+    ("timestamp", {"justify": "right"}),
+    ("global_number", {"justify": "right"}),
+    ("keyboard_keys", {"justify": "left"}),
+    ("mouse_buttons", {"justify": "left"}),
+    ("mouse_is_moving", {"justify": "center"}),
+    ("mouse_xy", {"justify": "center"}),
+    ("mouse_delta", {"justify": "center"}),
+    ("raw_input", {"justify": "center"}),
+]
+STATE_COLUMNS = [
+    ("held_keys", {"justify": "left"}),
+    ("held_buttons", {"justify": "left"}),
+    ("mouse_is_moving", {"justify": "center"}),
+    ("mouse_xy", {"justify": "center"}),
+]
+
+def make_table(title: str, header_style: str, columns) -> Table:
+    table = Table(title=title, header_style=header_style)
+    for name, options in columns:
+        table.add_column(name, **options)
+    return table
+
+def format_cell(value) -> str:
+    if value is None:
+        return "--"
+    if isinstance(value, list):
+        return ", ".join(map(str, value)) or "--"
+    return str(value)
+
 def visualization_console_listener():
     global vis_running
     while vis_running:
@@ -380,28 +771,18 @@ def visualization_console_listener():
 def visualize_dataset():
     global vis_running, dataset_name
 
-    trial_input = input("Enter trial number to visualize (leave blank for last trial): ").strip()
-    if trial_input == "":
-        chosen_trial = scan_existing_trials(dataset_name)
-        if chosen_trial < 0:
-            print("[WARN] No trials found in this dataset. Nothing to visualize.")
-            return
-    else:
-        try:
-            chosen_trial = int(trial_input)
-        except ValueError:
-            print("[WARN] Invalid trial number input. Aborting visualization.")
-            return
-
-    json_path = os.path.join(dataset_name, f"TrialData_{chosen_trial}.json")
-    if not os.path.exists(json_path):
-        print(f"[WARN] JSON for trial {chosen_trial} not found at: {json_path}")
+    chosen_trial = ask_trial_number("visualize")
+    if chosen_trial is None:
         return
 
-    with open(json_path, "r") as f:
-        data = json.load(f)
+    log_path = find_trial_log(chosen_trial)
+    if log_path is None:
+        print(f"[WARN] Log for trial {chosen_trial} not found in: {dataset_name}")
+        return
 
-    frames = [e for e in data if "filename" in e]
+    data = load_trial_data_log(log_path)
+
+    frames = [e for e in data if "frame_index" in e]
     if not frames:
         print(f"[WARN] No frame entries found in trial {chosen_trial}. Nothing to visualize.")
         return
@@ -411,10 +792,19 @@ def visualize_dataset():
         print(f"[WARN] Folder for trial {chosen_trial} not found: {trial_folder}")
         return
 
+    video_path = find_trial_video(trial_folder)
+    video_cap = cv2.VideoCapture(video_path) if video_path else None
+
     cv2.namedWindow("Visualization", cv2.WINDOW_NORMAL)
 
     idx = 0
     total_frames = len(frames)
+    # Duplicate frames resolve to the stored frame they reference
+    stream_indices = [f.get("stream_index", f["frame_index"]) for f in frames]
+    # Human-readable frame times, formatted once instead of on every navigation
+    frame_times = [
+        time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(f["timestamp"])) for f in frames
+    ]
 
     vis_thread = Thread(target=visualization_console_listener, daemon=True)
     vis_running = True
@@ -424,6 +814,49 @@ def visualize_dataset():
     console = Console()
     last_rendered_idx = None
 
+    # Decoded frames by stream index, least recently used first
+    frame_cache = OrderedDict()
+    cache_lock = Lock()
+    reader_lock = Lock()  # VideoCapture isn't thread-safe
+    prefetch_wakeup = Event()
+    prefetch_stop = Event()
+
+    def load_frame(stream_index):
+        with reader_lock:
+            return read_trial_frame(trial_folder, video_cap, stream_index)
+
+    def prefetch_frames():
+        """
+        Decodes the frames around 'idx' ahead of time, so scrubbing doesn't wait on disk/decode.
+        """
+        while not prefetch_stop.is_set():
+            target = idx
+            for j in range(-PREFETCH_BEHIND, PREFETCH_AHEAD + 1):
+                if prefetch_stop.is_set() or target != idx:
+                    break  # Moved on, restart around the new frame
+                fj = target + j
+                if not (0 <= fj < total_frames):
+                    continue
+                sj = stream_indices[fj]
+                if sj in frame_cache:
+                    continue
+                img = load_frame(sj)
+                if img is None:
+                    continue
+                with cache_lock:
+                    frame_cache[sj] = img
+                    if len(frame_cache) > FRAME_CACHE_SIZE:
+                        frame_cache.popitem(last=False)
+            prefetch_wakeup.wait(0.02)
+            prefetch_wakeup.clear()
+
+    prefetch_thread = Thread(target=prefetch_frames, daemon=True)
+    prefetch_thread.start()
+
+    # Frame + text strip, reused across renders (imshow copies it)
+    label_height = 30
+    canvas = None
+
     while vis_running and not stop_visualization_event.is_set():
         key = cv2.waitKeyEx(50)
         if key in LEFT_KEYS:
@@ -442,82 +875,80 @@ def visualize_dataset():
 
         if idx != last_rendered_idx:
             last_rendered_idx = idx
+            prefetch_wakeup.set()
             fdata = frames[idx]
-            frame_file = os.path.join(trial_folder, fdata["filename"])
-            if not os.path.exists(frame_file):
-                print(f"[WARN] Frame not found: {frame_file}")
-                break
-
-            img = cv2.imread(frame_file)
+            fname = frame_key(fdata["frame_index"])
+            stream_index = stream_indices[idx]
+            with cache_lock:
+                img = frame_cache.get(stream_index)
+                if img is not None:
+                    frame_cache.move_to_end(stream_index)
+            if img is None:
+                img = load_frame(stream_index)
             if img is None:
-                print(f"[WARN] Could not read frame: {frame_file}")
+                print(f"[WARN] Could not read frame: {fname}")
                 break
 
             # Make space at bottom for text
-            label_height = 30
-            extended = np.zeros((img.shape[0] + label_height, img.shape[1], 3), dtype=np.uint8)
-            extended[:img.shape[0], :img.shape[1]] = img
-
-            # Convert timestamp to human-readable
-            f_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(fdata["timestamp"]))
-            info_text = f"{fdata['filename']} | {f_time}"
+            h, w = img.shape[:2]
+            if canvas is None or canvas.shape[:2] != (h + label_height, w):
+                canvas = np.zeros((h + label_height, w, 3), dtype=np.uint8)
+            canvas[:h] = img
+            canvas[h:] = 0  # Only the text strip needs clearing
+
+            f_time = frame_times[idx]
+            info_text = f"{fname} | {f_time}"
             cv2.putText(
-                extended, info_text,
-                (10, img.shape[0] + 20),
+                canvas, info_text,
+                (10, h + 20),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 1
             )
-            cv2.imshow("Visualization", extended)
+            cv2.imshow("Visualization", canvas)
 
-            console.clear()
-            console.print(
-                f"[bold green]{f_time} | Frame {idx+1}/{total_frames} | {fdata['filename']}[/bold green]"
-            )
+            renderables = [
+                f"[bold green]{f_time} | Frame {idx+1}/{total_frames} | {fname}[/bold green]"
+            ]
 
             # Build events table
             if fdata["events"]:
-                table = Table(title="Events in this frame", header_style="bold cyan")
-                table.add_column("local_number", style="dim")
-                table.add_column("timestamp", justify="right")
-                table.add_column("global_number", justify="right")
-                table.add_column("keyboard_keys", justify="left")
-                table.add_column("mouse_buttons", justify="left")
-                table.add_column("mouse_is_moving", justify="center")
-                table.add_column("mouse_xy", justify="center")
-                table.add_column("mouse_delta", justify="center")
-                table.add_column("raw_input", justify="center")
-
+                table = make_table("Events in this frame", "bold cyan", EVENT_COLUMNS)
                 for evt in fdata["events"]:
-                    loc_num = str(evt.get("number", "--"))
-                    gnum = str(evt.get("global_number", "--"))
-                    evt_ts = f"{evt.get('timestamp', '--'):.4f}" if "timestamp" in evt else "--"
-                    kb = str(evt.get("keyboard_keys", [])) or "--"
-                    mb = str(evt.get("mouse_buttons", [])) or "--"
-                    mm = str(evt.get("mouse_is_moving", "--"))
-                    mxy = str(evt.get("mouse_xy", "--"))
-                    mdelta = str(evt.get("mouse_delta", "--"))
-                    raw = str(evt.get("raw_input", False))
-
-                    table.add_row(loc_num, evt_ts, gnum, kb, mb, mm, mxy, mdelta, raw)
-
-                console.print(table)
+                    # Monotonic event time shown on the wall clock of the frame
+                    evt_ts = f"{event_wall_time(evt, fdata):.4f}" if "timestamp_ns" in evt else "--"
+                    table.add_row(
+                        format_cell(evt.get("number")),
+                        evt_ts,
+                        format_cell(evt.get("global_number")),
+                        format_cell(evt.get("keyboard_keys")),
+                        format_cell(evt.get("mouse_buttons")),
+                        format_cell(evt.get("mouse_is_moving")),
+                        format_cell(evt.get("mouse_xy")),
+                        format_cell(evt.get("mouse_delta")),
+                        format_cell(evt.get("raw_input", False)),
+                    )
+                renderables.append(table)
             else:
-                console.print("[dim]-- no events --[/dim]")
+                renderables.append("[dim]-- no events --[/dim]")
 
             # Additional "Frame State"
-            state_table = Table(title="Frame State at Capture", header_style="bold magenta")
-            state_table.add_column("held_keys", justify="left")
-            state_table.add_column("held_buttons", justify="left")
-            state_table.add_column("mouse_is_moving", justify="center")
-            state_table.add_column("mouse_xy", justify="center")
-
-            hk_str = str(fdata.get("held_keys", []))
-            hb_str = str(fdata.get("held_buttons", []))
-            mm_str = str(fdata.get("mouse_is_moving", "--"))
-            xy_str = str(fdata.get("mouse_xy", "--"))
+            state_table = make_table("Frame State at Capture", "bold magenta", STATE_COLUMNS)
+            state_table.add_row(
+                format_cell(fdata.get("held_keys")),
+                format_cell(fdata.get("held_buttons")),
+                format_cell(fdata.get("mouse_is_moving")),
+                format_cell(fdata.get("mouse_xy")),
+            )
+            renderables.append(state_table)
 
-            state_table.add_row(hk_str, hb_str, mm_str, xy_str)
-            console.print(state_table)
+            # Clear and redraw in one go, only when the frame changed
+            console.clear()
+            console.print(Group(*renderables))
 
+    prefetch_stop.set()
+    prefetch_wakeup.set()
+    prefetch_thread.join()
+    if video_cap is not None:
+        video_cap.release()
     cv2.destroyWindow("Visualization")
     console.clear()
     print("[INFO] Visualization mode ended.")
@@ -563,20 +994,52 @@ def convert_images_to_numpy(image_folder, output_npz):
     np.savez_compressed(output_npz, **images_dict)
     print(f"[INFO] Saved {len(images_dict)} images to {output_npz}")
 
-def parse_json_metadata(json_path):
+def convert_video_to_numpy(video_path, output_npz):
     """
-    Parses a JSON dataset file and extracts relevant metadata.
+    Decodes all frames of a trial video to NumPy arrays and saves them in a .npz file.
+
+    - Keeps the original frame size (NO SCALING)
+    - Maintains RGB color information
+    - Stores frame N of the video under the key 'frame_N'
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"[ERROR] Could not open video {video_path}.")
+        return
+
+    images_dict = {}
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))  # Container estimate, may be 0
+    with tqdm(total=total or None, desc="Decoding Video") as pbar:
+        while True:
+            ok, img = cap.read()
+            if not ok:
+                break
+            # BGR to RGB
+            images_dict[frame_key(len(images_dict))] = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            pbar.update(1)
+    cap.release()
+
+    if not images_dict:
+        print(f"[ERROR] No frames could be decoded from {video_path}.")
+        return
+
+    np.savez_compressed(output_npz, **images_dict)
+    print(f"[INFO] Saved {len(images_dict)} images to {output_npz}")
+
+def parse_trial_metadata(log_path):
+    """
+    Parses a trial log (MessagePack, or legacy JSON) and extracts relevant metadata.
 
     - Omits everything before 'trial_start' and after 'trial_end'
     - Extracts:
-        - filename (without .webp extension) -> aligns with NPZ keys
+        - frame_index as 'frame_N' -> key of the combined dataset
+        - image_key 'frame_<stream_index>' -> aligns with the images NPZ keys
         - timestamp (shifted to start from 00:00:00.000 in HH:MM:SS.mmm)
         - held_keys (lowercase, deduplicated)
     """
     from datetime import timedelta
 
-    with open(json_path, "r") as f:
-        data = json.load(f)
+    data = load_trial_data_log(log_path)
 
     parsed_data = {}
     in_trial = False
@@ -592,9 +1055,9 @@ def parse_json_metadata(json_path):
             in_trial = False
             break
 
-        if in_trial and "filename" in entry:
-            frame_key = entry["filename"].replace(".webp", "")
-            timestamp = entry["timestamp"]
+        if in_trial and "frame_index" in entry:
+            fkey = frame_key(entry["frame_index"])
+            timestamp = entry["timestamp_ns"] / 1e9
             held_keys = entry.get("held_keys", [])
 
             # normalize keys: lower + deduplicate
@@ -608,28 +1071,33 @@ def parse_json_metadata(json_path):
             # format
             td = str(timedelta(seconds=shifted))[:12]  # e.g. '0:00:00.234'
             
-            parsed_data[frame_key] = {
+            parsed_data[fkey] = {
                 "timestamp": td,
-                "held_keys": held_keys
+                "held_keys": held_keys,
+                # NPZ key of the stored frame (duplicates share their original's)
+                "image_key": frame_key(entry.get("stream_index", entry["frame_index"]))
             }
 
-    print(f"[INFO] Parsed {len(parsed_data)} frames from JSON.")
+    print(f"[INFO] Parsed {len(parsed_data)} frames from the trial log.")
     return parsed_data
 
-def create_combined_dataset(image_npz_path, metadata_json_path):
+def create_combined_dataset(image_npz_path, log_path):
     """
-    Loads images (from .npz) and metadata (parsed JSON), combines into a single dict:
+    Loads images (from .npz) and metadata (parsed trial log), combines into a single dict:
     { frame_x: { image: np.array, timestamp: .., held_keys: [...] } }
     """
     images = np.load(image_npz_path)
-    metadata = parse_json_metadata(metadata_json_path)
+    metadata = parse_trial_metadata(log_path)
 
     dataset = {}
-    for frame_name in images.keys():
+    for frame_name, meta in metadata.items():
+        if meta["image_key"] not in images:
+            print(f"[WARN] No image stored for {frame_name}, skipping...")
+            continue
         dataset[frame_name] = {
-            "image": images[frame_name],
-            "timestamp": metadata.get(frame_name, {}).get("timestamp", None),
-            "held_keys": metadata.get(frame_name, {}).get("held_keys", [])
+            "image": images[meta["image_key"]],
+            "timestamp": meta["timestamp"],
+            "held_keys": meta["held_keys"]
         }
 
     print(f"[INFO] Dataset created with {len(dataset)} frames.")
@@ -682,10 +1150,11 @@ def initialize_dataset():
         break
 
 def start_trial():
-    global recording, trial_data_log, trial_frame_counter
+    global recording, trial_frame_counter
     global dataset_name, next_trial_number, trial_folder_path
     global stop_capture_event, pending_events, global_event_count
-    global mac_raw_poll_thread
+    global mac_raw_poll_thread, frame_writer_thread, trial_video_writer, frame_encode_pool
+    global pending_move_event
 
     if not dataset_name:
         print("[WARN] No dataset initialized. Use 'N' to set it up.")
@@ -696,24 +1165,40 @@ def start_trial():
 
     trial_folder_path = os.path.join(dataset_name, f"Trial_{next_trial_number}")
     ensure_folder_exists(trial_folder_path)
+    trial_video_writer = open_trial_video_writer(trial_folder_path)
 
-    trial_data_log.clear()
+    open_trial_data_log(next_trial_number)
     trial_frame_counter = 0
     with state_lock:
         pending_events.clear()
         global_event_count = 0
+        pending_move_event = None
 
-    trial_data_log.append({
+    append_trial_data_log({
         "type": "trial_start",
         "timestamp": time.time(),
+        "timestamp_ns": time.monotonic_ns(),
         "trial_number": next_trial_number
     })
 
     stop_capture_event.clear()
+    capture_done_event.clear()
+    frame_writer_failed.clear()
     recording = True
 
+    # Start frame writer thread (video) or encoder pool (images)
+    if trial_video_writer is not None:
+        frame_writer_thread = Thread(target=frame_writer, daemon=True)
+        frame_writer_thread.start()
+    else:
+        # Workers start lazily from the capture thread, so undo any pinning they inherit
+        frame_encode_pool = ThreadPoolExecutor(
+            max_workers=FRAME_ENCODE_WORKERS, initializer=restore_cpu_affinity
+        )
+
     # Start screen capture thread
-    t = Thread(target=capture_screen, daemon=True)
+    prepare_capture_pinning()
+    t = Thread(target=run_capture_thread, daemon=True)
     t.start()
 
     # If on mac and user enabled raw data
@@ -725,9 +1210,9 @@ def start_trial():
     print(f"[INFO] Started trial #{next_trial_number} in: {trial_folder_path}")
 
 def stop_trial():
-    global recording, trial_data_log, next_trial_number
+    global recording, next_trial_number
     global stop_capture_event
-    global dataset_name, trial_folder_path
+    global dataset_name, trial_folder_path, trial_video_writer, frame_encode_pool
 
     if not recording:
         print("[WARN] No trial is currently recording. Use 'S' to start a trial.")
@@ -737,31 +1222,49 @@ def stop_trial():
     stop_capture_event.set()
     recording = False
 
-    # Insert trial_end
-    trial_data_log.append({
+    # Wait for capture thread to exit gracefully. Nothing below may run before it has:
+    # it still writes to the trial log and hands frames to the writers
+    if not capture_done_event.wait(2.0):
+        print("[WARN] Capture thread is slow to stop (busy writing frames?), still waiting...")
+        capture_done_event.wait()
+
+    # Insert trial_end (after the capture thread logged its last frame)
+    append_trial_data_log({
         "type": "trial_end",
         "timestamp": time.time(),
+        "timestamp_ns": time.monotonic_ns(),
         "trial_number": next_trial_number
     })
 
-    time.sleep(0.5)  # Wait for capture thread to exit gracefully
+    # Flush queued frames to disk before post-processing reads them
+    if trial_video_writer is not None:
+        frame_write_q.put(None)
+        frame_writer_thread.join()
+        trial_video_writer.release()
+        trial_video_writer = None
+    else:
+        frame_encode_pool.shutdown(wait=True)
+        frame_encode_pool = None
 
     # Save the raw metadata log
     save_trial_data_log(next_trial_number)
     print(f"[INFO] Trial #{next_trial_number} ended.")
 
-    # Now automatically do the post-processing after 0.2s
-    time.sleep(0.2)
+    # Now automatically do the post-processing
     print("[INFO] Post-processing images and metadata...")
 
     # 1) Convert images to NPZ
     trial_folder_path = os.path.join(dataset_name, f"Trial_{next_trial_number}")
     images_npz_path = os.path.join(trial_folder_path, f"Trial_{next_trial_number}_images.npz")
-    convert_images_to_numpy(trial_folder_path, images_npz_path)
+    video_path = find_trial_video(trial_folder_path)
+    if video_path:
+        convert_video_to_numpy(video_path, images_npz_path)
+    else:
+        convert_images_to_numpy(trial_folder_path, images_npz_path)
 
     # 2) Create combined dataset
-    json_path = os.path.join(dataset_name, f"TrialData_{next_trial_number}.json")
-    combined_dataset = create_combined_dataset(images_npz_path, json_path)
+    log_path = trial_log_path(next_trial_number)
+    combined_dataset = create_combined_dataset(images_npz_path, log_path)
 
     # 3) Save combined dataset
     combined_npz_path = os.path.join(dataset_name, f"Trial_{next_trial_number}_combined.npz")
@@ -771,6 +1274,30 @@ def stop_trial():
     # Prepare for next trial
     next_trial_number += 1
 
+def export_trial_json():
+    """
+    Exports a trial log to TrialData_<N>.json in the original log format (indented JSON array,
+    frames with 'filename', events with wall-clock 'timestamp'), for tools that expect it.
+    Image files named by 'filename' only exist for trials saved as .webp frames.
+    """
+    if not dataset_name:
+        print("[WARN] No dataset initialized. Use 'N' to set it up.")
+        return
+
+    chosen_trial = ask_trial_number("export")
+    if chosen_trial is None:
+        return
+
+    log_path = trial_log_path(chosen_trial)
+    if not os.path.exists(log_path):
+        print(f"[WARN] Log for trial {chosen_trial} not found at: {log_path}")
+        return
+
+    json_filename = os.path.join(dataset_name, f"TrialData_{chosen_trial}.json")
+    with open(json_filename, "w") as f:
+        json.dump([to_legacy_entry(entry) for entry in load_trial_data_log(log_path)], f, indent=4)
+    print(f"[INFO] Trial #{chosen_trial} data exported to {json_filename}")
+
 def exit_program():
     global running
     if recording:
@@ -814,7 +1341,7 @@ def main():
     initialize_dataset()
 
     while running:
-        cmd = input("Enter command [S=Start, Q=Stop, QQ=Exit, N=Reset, V=Visualize]: ").strip().lower()
+        cmd = input("Enter command [S=Start, Q=Stop, QQ=Exit, N=Reset, V=Visualize, E=Export JSON]: ").strip().lower()
         if cmd == "s":
             start_trial()
         elif cmd == "q":
@@ -826,6 +1353,8 @@ def main():
             reset_program()
         elif cmd == "v":
             visualize_dataset()
+        elif cmd == "e":
+            export_trial_json()
         else:
             print(f"[WARN] Unknown command: {cmd}")
 